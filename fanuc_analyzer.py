@@ -16,30 +16,87 @@ import os
 import re
 import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from collections import defaultdict, Counter
 from typing import Dict, List, Tuple, Set, Optional, Any
 
 
+# The per-line scanning patterns benefit from a DFA-based engine; use
+# google-re2 when available (pip install google-re2) and fall back to the
+# stdlib re otherwise. Both expose the same compile/search/finditer API.
+try:
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+# Precompiled per-line patterns. These fire once (or more) per code line, so
+# compiling them at import time keeps re._compile cache lookups out of the
+# hot parse loop. All patterns are bytes: .LS files are latin-1/ASCII, and
+# scanning raw bytes skips decoding whole files up front; names are decoded
+# only where they are stored.
+_LBL_RE = _re_engine.compile(rb'LBL\[(\d+)(?::([^\]]+))?\]')
+_JMP_RE = _re_engine.compile(rb'JMP\s+LBL\[(\d+)')
+_CALL_RE = _re_engine.compile(rb'CALL\s+(\w+)')
+_IML_RE = _re_engine.compile(rb'(?i)IML|FOLIE')
+# Combined R/DI/DO/RI/RO/PR reference pattern: one scan of each line instead
+# of six. The \b keeps the trailing R of PR[..]/TIMER[..] from also matching
+# as a bare R[..] reference.
+_XREF_RE = _re_engine.compile(rb'\b(R|DI|DO|RI|RO|PR)\[(\d+)(?::([^\]]+))?\]')
+_POS_DEF_RE = re.compile(rb'P\[(\d+)(?::"([^"]+)")?\]')
+
+# /ATTR key patterns as (key, pattern, is_date_pair) records; iterating a
+# tuple of tuples allocates nothing per file
+_ATTR_PATTERNS = (
+    ('OWNER', re.compile(rb'OWNER\s*=\s*([^;]+);'), False),
+    ('COMMENT', re.compile(rb'COMMENT\s*=\s*"([^"]+)"'), False),
+    ('PROG_SIZE', re.compile(rb'PROG_SIZE\s*=\s*(\d+)'), False),
+    ('CREATE', re.compile(rb'CREATE\s*=\s*DATE\s+([\d-]+)\s+TIME\s+([\d:]+)'), True),
+    ('MODIFIED', re.compile(rb'MODIFIED\s*=\s*DATE\s+([\d-]+)\s+TIME\s+([\d:]+)'), True),
+    ('LINE_COUNT', re.compile(rb'LINE_COUNT\s*=\s*(\d+)'), False),
+    ('MEMORY_SIZE', re.compile(rb'MEMORY_SIZE\s*=\s*(\d+)'), False),
+    ('PROTECT', re.compile(rb'PROTECT\s*=\s*([^;]+);'), False),
+)
+
+
 class FANUCProgram:
     """Represents a single FANUC robot program"""
-    
+
+    # Fixed attribute layout: thousands of instances exist for large
+    # corpora, and dropping the per-instance __dict__ saves a couple of
+    # hundred bytes each while speeding attribute access
+    __slots__ = ('filename', 'name', 'attributes', 'labels', 'positions',
+                 'registers_used', 'digital_inputs', 'digital_outputs',
+                 'register_inputs', 'register_outputs', 'calls', 'jumps',
+                 '_code_line_count', 'position_registers', '_pr_seen', 'errors',
+                 'program_type', 'product_code', 'has_iml', 'statistics')
+
+    # Classification patterns, shared by all instances. Subprogram markers are
+    # substrings rather than prefixes because names like B_AFLG_B carry the
+    # marker mid-name.
+    _MAIN_RE = re.compile(r'A_1PA\d{3}')
+    _PRODUCT_RE = re.compile(r'_(384|096|1536CC|005|017|140|180)')
+    _SUBPROG_MARKERS = ('KER1_', 'KER2_', 'AFLG_', 'PRINTEN', 'BUF_')
+    _UTIL_NAMES = frozenset({'HOMING', 'HOMEN', 'HOMEN1', 'TEKST', 'FOLIE', 'DUMPEN', 'RUST'})
+    _SYSTEM_NAMES = frozenset({'LOGBOOK', 'PMC'})
+
     def __init__(self, filename: str):
         self.filename = filename
         self.name = ""
         self.attributes = {}
-        self.labels = []  # List of (label_num, label_name, line_num)
+        self.labels = []  # List of (label_num, label_name)
         self.positions = []  # List of position definitions
         self.registers_used = set()  # Set of R[X] used
         self.digital_inputs = set()  # Set of DI[X] used
         self.digital_outputs = set()  # Set of DO[X] used
         self.register_inputs = set()  # Set of RI[X] used
         self.register_outputs = set()  # Set of RO[X] used
-        self.calls = []  # List of (subprogram_name, line_num)
-        self.jumps = []  # List of (target_label, line_num)
-        self.code_lines = []  # Raw code lines from /MN section
+        self.calls = []  # List of called subprogram names
+        self.jumps = []  # List of jump target label numbers
+        self._code_line_count = 0  # Code lines seen in the /MN section
         self.position_registers = []  # PR[X] position registers
+        self._pr_seen = set()  # Dedup helper for position_registers
         self.errors = []  # Error labels (LBL[500-799])
         self.program_type = "unknown"
         self.product_code = None
@@ -51,37 +108,32 @@ class FANUCProgram:
         name = self.name
         
         # Main programs
-        if re.match(r'A_1PA\d{3}', name):
+        if name.startswith('A_1PA') and self._MAIN_RE.match(name):
             self.program_type = "main"
-            # Extract product code if present
-            for line in self.code_lines:
-                if 'IML' in line.upper() or 'FOLIE' in line.upper():
-                    self.has_iml = True
-                    break
-            
+
         # Subprograms
-        elif any(prefix in name for prefix in ['KER1_', 'KER2_', 'AFLG_', 'PRINTEN', 'BUF_']):
+        elif any(marker in name for marker in self._SUBPROG_MARKERS):
             self.program_type = "subprogram"
             # Extract product code
-            match = re.search(r'_(384|096|1536CC|005|017|140|180)', name)
+            match = self._PRODUCT_RE.search(name)
             if match:
                 self.product_code = match.group(1)
-                
+
         # Utility programs
-        elif name in ['HOMING', 'HOMEN', 'HOMEN1', 'TEKST', 'FOLIE', 'DUMPEN', 'RUST']:
+        elif name in self._UTIL_NAMES:
             self.program_type = "utility"
-            
+
         # System programs
-        elif name.startswith('ERR') or name in ['LOGBOOK', 'PMC']:
+        elif name.startswith('ERR') or name in self._SYSTEM_NAMES:
             self.program_type = "system"
-            
+
         else:
             self.program_type = "other"
     
     def calculate_statistics(self):
         """Calculate various statistics about the program"""
         self.statistics = {
-            'total_lines': len(self.code_lines),
+            'total_lines': self._code_line_count,
             'label_count': len(self.labels),
             'call_count': len(self.calls),
             'jump_count': len(self.jumps),
@@ -97,164 +149,170 @@ class FANUCProgram:
 
 class FANUCParser:
     """Parser for FANUC .LS program files"""
-    
+
+    # /PROG header pattern, compiled once for all files
+    _PROG_RE = re.compile(rb'/PROG\s+(\w+)')
+
     def __init__(self):
         self.programs = {}
         
     def parse_file(self, filepath: str) -> FANUCProgram:
-        """Parse a single FANUC .LS file"""
+        """Parse a single FANUC .LS file in one streaming pass"""
         program = FANUCProgram(os.path.basename(filepath))
-        
-        with open(filepath, 'r', encoding='latin-1', errors='ignore') as f:
-            content = f.read()
-        
-        # Parse sections
-        self._parse_header(program, content)
-        self._parse_attributes(program, content)
-        self._parse_code(program, content)
-        self._parse_positions(program, content)
-        
+
+        # Dispatch table for combined R/DI/DO/RI/RO references (PR is handled
+        # separately because it deduplicates into an ordered list)
+        xref_targets = {
+            b'R': program.registers_used.add,
+            b'DI': program.digital_inputs.add,
+            b'DO': program.digital_outputs.add,
+            b'RI': program.register_inputs.add,
+            b'RO': program.register_outputs.add,
+        }
+
+        # Route each line to its section's parser instead of re-scanning the
+        # whole file once per section. /MN lines are parsed directly; /ATTR
+        # and /POS are buffered because their patterns span the section text.
+        attr_lines = []
+        pos_lines = []
+        section = None
+
+        # Binary mode: .LS files are latin-1, and the patterns are all
+        # ASCII, so scanning bytes avoids decoding entire files
+        with open(filepath, 'rb') as f:
+            for raw_line in f:
+                if raw_line.startswith(b'/'):
+                    if raw_line.startswith(b'/PROG'):
+                        match = self._PROG_RE.search(raw_line)
+                        if match:
+                            program.name = match.group(1).decode('latin-1')
+                        section = None
+                    elif raw_line.startswith(b'/ATTR'):
+                        section = 'attr'
+                    elif raw_line.startswith(b'/MN'):
+                        section = 'mn'
+                    elif raw_line.startswith(b'/POS'):
+                        section = 'pos'
+                    elif raw_line.startswith((b'/APPL', b'/END')):
+                        section = None
+                    continue
+
+                if section == 'mn':
+                    self._parse_code_line(program, raw_line.strip(), xref_targets)
+                elif section == 'attr':
+                    attr_lines.append(raw_line)
+                elif section == 'pos':
+                    pos_lines.append(raw_line)
+
+        if attr_lines:
+            self._parse_attributes(program, b''.join(attr_lines))
+        if pos_lines:
+            self._parse_positions(program, b''.join(pos_lines))
+
         # Classify and calculate statistics
         program.classify_program()
         program.calculate_statistics()
-        
+
         return program
-    
-    def _parse_header(self, program: FANUCProgram, content: str):
-        """Parse /PROG header"""
-        match = re.search(r'/PROG\s+(\w+)', content)
-        if match:
-            program.name = match.group(1)
-    
-    def _parse_attributes(self, program: FANUCProgram, content: str):
+
+    def _parse_attributes(self, program: FANUCProgram, attr_text: bytes):
         """Parse /ATTR section"""
-        attr_section = re.search(r'/ATTR(.*?)/(?:APPL|MN)', content, re.DOTALL)
-        if not attr_section:
-            return
-        
-        attr_text = attr_section.group(1)
-        
         # Parse key attributes
-        patterns = {
-            'OWNER': r'OWNER\s*=\s*([^;]+);',
-            'COMMENT': r'COMMENT\s*=\s*"([^"]+)"',
-            'PROG_SIZE': r'PROG_SIZE\s*=\s*(\d+)',
-            'CREATE': r'CREATE\s*=\s*DATE\s+([\d-]+)\s+TIME\s+([\d:]+)',
-            'MODIFIED': r'MODIFIED\s*=\s*DATE\s+([\d-]+)\s+TIME\s+([\d:]+)',
-            'LINE_COUNT': r'LINE_COUNT\s*=\s*(\d+)',
-            'MEMORY_SIZE': r'MEMORY_SIZE\s*=\s*(\d+)',
-            'PROTECT': r'PROTECT\s*=\s*([^;]+);',
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, attr_text)
+        for key, pattern, is_date in _ATTR_PATTERNS:
+            match = pattern.search(attr_text)
             if match:
-                if key in ['CREATE', 'MODIFIED']:
-                    program.attributes[key] = f"{match.group(1)} {match.group(2)}"
+                if is_date:
+                    date = match.group(1).decode('latin-1')
+                    time = match.group(2).decode('latin-1')
+                    program.attributes[key] = f"{date} {time}"
                 else:
-                    program.attributes[key] = match.group(1).strip()
+                    program.attributes[key] = match.group(1).strip().decode('latin-1')
     
-    def _parse_code(self, program: FANUCProgram, content: str):
-        """Parse /MN section (main code)"""
-        mn_section = re.search(r'/MN(.*?)/(?:POS|END)', content, re.DOTALL)
-        if not mn_section:
+    def _parse_code_line(self, program: FANUCProgram, line: bytes, xref_targets):
+        """Parse a single stripped line from the /MN section"""
+        if not line or line.startswith(b'!'):
             return
-        
-        code_text = mn_section.group(1)
-        lines = code_text.split('\n')
-        
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line or line.startswith('!'):
-                continue
-            
-            program.code_lines.append(line)
-            
-            # Parse labels
-            label_match = re.search(r'LBL\[(\d+)(?::([^\]]+))?\]', line)
+
+        program._code_line_count += 1
+
+        # IML / film handling detection (was a second pass over code_lines)
+        if not program.has_iml and _IML_RE.search(line):
+            program.has_iml = True
+
+        # Cheap substring gates keep the regex engine off the majority of
+        # lines (plain motion commands), which match none of these
+
+        # Parse labels
+        if b'LBL[' in line:
+            label_match = _LBL_RE.search(line)
             if label_match:
                 label_num = int(label_match.group(1))
-                label_name = label_match.group(2) if label_match.group(2) else ""
-                program.labels.append((label_num, label_name, i))
-                
+                label_name = label_match.group(2).decode('latin-1') if label_match.group(2) else ""
+                program.labels.append((label_num, label_name))
+
                 # Identify error labels (500-799)
                 if 500 <= label_num < 800:
                     program.errors.append((label_num, label_name))
-            
+
             # Parse jumps
-            jump_match = re.search(r'JMP\s+LBL\[(\d+)', line)
-            if jump_match:
-                program.jumps.append((int(jump_match.group(1)), i))
-            
-            # Parse CALL statements
-            call_match = re.search(r'CALL\s+(\w+)', line)
+            if b'JMP' in line:
+                jump_match = _JMP_RE.search(line)
+                if jump_match:
+                    program.jumps.append(int(jump_match.group(1)))
+
+        # Parse CALL statements
+        if b'CALL' in line:
+            call_match = _CALL_RE.search(line)
             if call_match:
-                program.calls.append((call_match.group(1), i))
-            
-            # Parse registers R[X]
-            for reg_match in re.finditer(r'R\[(\d+)(?::([^\]]+))?\]', line):
-                reg_num = int(reg_match.group(1))
-                reg_name = reg_match.group(2) if reg_match.group(2) else ""
-                program.registers_used.add((reg_num, reg_name))
-            
-            # Parse Digital Inputs DI[X]
-            for di_match in re.finditer(r'DI\[(\d+)(?::([^\]]+))?\]', line):
-                di_num = int(di_match.group(1))
-                di_name = di_match.group(2) if di_match.group(2) else ""
-                program.digital_inputs.add((di_num, di_name))
-            
-            # Parse Digital Outputs DO[X]
-            for do_match in re.finditer(r'DO\[(\d+)(?::([^\]]+))?\]', line):
-                do_num = int(do_match.group(1))
-                do_name = do_match.group(2) if do_match.group(2) else ""
-                program.digital_outputs.add((do_num, do_name))
-            
-            # Parse Register Inputs RI[X]
-            for ri_match in re.finditer(r'RI\[(\d+)(?::([^\]]+))?\]', line):
-                ri_num = int(ri_match.group(1))
-                ri_name = ri_match.group(2) if ri_match.group(2) else ""
-                program.register_inputs.add((ri_num, ri_name))
-            
-            # Parse Register Outputs RO[X]
-            for ro_match in re.finditer(r'RO\[(\d+)(?::([^\]]+))?\]', line):
-                ro_num = int(ro_match.group(1))
-                ro_name = ro_match.group(2) if ro_match.group(2) else ""
-                program.register_outputs.add((ro_num, ro_name))
-            
-            # Parse Position Registers PR[X]
-            for pr_match in re.finditer(r'PR\[(\d+)(?::([^\]]+))?\]', line):
-                pr_num = int(pr_match.group(1))
-                pr_name = pr_match.group(2) if pr_match.group(2) else ""
-                if (pr_num, pr_name) not in program.position_registers:
-                    program.position_registers.append((pr_num, pr_name))
-    
-    def _parse_positions(self, program: FANUCProgram, content: str):
+                program.calls.append(call_match.group(1).decode('latin-1'))
+
+        # Parse R/DI/DO/RI/RO/PR references in a single pass
+        for xref_match in _XREF_RE.finditer(line):
+            kind = xref_match.group(1)
+            num = int(xref_match.group(2))
+            name = xref_match.group(3).decode('latin-1') if xref_match.group(3) else ""
+            if kind == b'PR':
+                if (num, name) not in program._pr_seen:
+                    program._pr_seen.add((num, name))
+                    program.position_registers.append((num, name))
+            else:
+                xref_targets[kind]((num, name))
+
+    def _parse_positions(self, program: FANUCProgram, pos_text: bytes):
         """Parse /POS section"""
-        pos_section = re.search(r'/POS(.*?)/END', content, re.DOTALL)
-        if not pos_section:
-            return
-        
-        pos_text = pos_section.group(1)
-        
         # Parse position definitions P[X:"name"]
-        for pos_match in re.finditer(r'P\[(\d+)(?::"([^"]+)")?\]', pos_text):
+        for pos_match in _POS_DEF_RE.finditer(pos_text):
             pos_num = int(pos_match.group(1))
-            pos_name = pos_match.group(2) if pos_match.group(2) else ""
+            pos_name = pos_match.group(2).decode('latin-1') if pos_match.group(2) else ""
             program.positions.append((pos_num, pos_name))
 
 
+def _parse_file_task(filepath: str):
+    """Parse one .LS file in a worker process.
+
+    Returns (filepath, program, error) so per-file failures surface in the
+    parent instead of aborting the whole pool.
+    """
+    try:
+        return filepath, FANUCParser().parse_file(filepath), None
+    except Exception as e:
+        return filepath, None, e
+
+
 class FANUCAnalyzer:
     """Analyzer for FANUC robot programs"""
     
     def __init__(self, parser: FANUCParser):
         self.parser = parser
         self.call_graph = defaultdict(list)
+        self._sorted_children = {}
         self.register_map = defaultdict(set)
+        self.register_program_count = defaultdict(int)
         self.io_map = {
-            'DI': defaultdict(set),
-            'DO': defaultdict(set),
-            'RI': defaultdict(set),
-            'RO': defaultdict(set)
+            'DI': {},
+            'DO': {},
+            'RI': {},
+            'RO': {}
         }
         
     def analyze_all(self, directory: str):
@@ -262,13 +320,18 @@ class FANUCAnalyzer:
         ls_files = list(Path(directory).glob('*.LS'))
         
         print(f"Found {len(ls_files)} FANUC program files")
-        
-        for filepath in sorted(ls_files):
-            try:
-                program = self.parser.parse_file(str(filepath))
-                self.parser.programs[program.name] = program
-            except Exception as e:
-                print(f"Error parsing {filepath}: {e}")
+
+        # File parses are independent and CPU-bound, so fan them out across
+        # cores; only the small FANUCProgram results come back.
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(_parse_file_task,
+                                   (str(p) for p in sorted(ls_files)),
+                                   chunksize=8)
+            for filepath, program, error in results:
+                if error is not None:
+                    print(f"Error parsing {filepath}: {error}")
+                else:
+                    self.parser.programs[program.name] = program
         
         self._build_call_graph()
         self._build_register_map()
@@ -277,8 +340,12 @@ class FANUCAnalyzer:
     def _build_call_graph(self):
         """Build call graph from all programs"""
         for prog_name, program in self.parser.programs.items():
-            for called_prog, _ in program.calls:
+            for called_prog in program.calls:
                 self.call_graph[prog_name].append(called_prog)
+        # Dedup and sort each child list once; the call-tree writer walks
+        # these repeatedly for every main program
+        self._sorted_children = {name: sorted(set(called))
+                                 for name, called in self.call_graph.items()}
     
     def _build_register_map(self):
         """Build comprehensive register map"""
@@ -286,261 +353,261 @@ class FANUCAnalyzer:
             for reg_num, reg_name in program.registers_used:
                 if reg_name:
                     self.register_map[reg_num].add(reg_name)
+            # Count each register once per program that uses it, so the
+            # report doesn't rescan every program per register
+            for reg_num in {r[0] for r in program.registers_used}:
+                self.register_program_count[reg_num] += 1
     
     def _build_io_map(self):
         """Build comprehensive IO map"""
         for program in self.parser.programs.values():
-            for di_num, di_name in program.digital_inputs:
-                if di_name:
-                    self.io_map['DI'][di_num].add(di_name)
-            for do_num, do_name in program.digital_outputs:
-                if do_name:
-                    self.io_map['DO'][do_num].add(do_name)
-            for ri_num, ri_name in program.register_inputs:
-                if ri_name:
-                    self.io_map['RI'][ri_num].add(ri_name)
-            for ro_num, ro_name in program.register_outputs:
-                if ro_name:
-                    self.io_map['RO'][ro_num].add(ro_name)
+            for io_type, refs in (('DI', program.digital_inputs),
+                                  ('DO', program.digital_outputs),
+                                  ('RI', program.register_inputs),
+                                  ('RO', program.register_outputs)):
+                # Plain dict with an explicit get avoids the
+                # defaultdict.__missing__ detour on every add
+                io_names = self.io_map[io_type]
+                for num, name in refs:
+                    if name:
+                        names = io_names.get(num)
+                        if names is None:
+                            io_names[num] = names = set()
+                        names.add(name)
     
     def generate_report(self, output_file: str):
         """Generate comprehensive analysis report"""
+        out = [
+            "=" * 80 + "\n",
+            "FANUC ROBOT PROGRAM ANALYSIS REPORT\n",
+            "=" * 80 + "\n\n",
+            f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"Total Programs: {len(self.parser.programs)}\n\n",
+        ]
+
+        # Sort the programs once; the classification, error and detail
+        # writers all want the same name ordering
+        sorted_programs = sorted(self.parser.programs.items())
+
+        # Writers append into the shared list; the whole report is then
+        # encoded and written in a single call
+        self._write_executive_summary(out)
+        self._write_program_classification(out, sorted_programs)
+        self._write_call_graph(out)
+        self._write_register_map(out)
+        self._write_io_map(out)
+        self._write_error_analysis(out, sorted_programs)
+        self._write_program_details(out, sorted_programs)
+
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("FANUC ROBOT PROGRAM ANALYSIS REPORT\n")
-            f.write("=" * 80 + "\n\n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total Programs: {len(self.parser.programs)}\n\n")
-            
-            # Executive Summary
-            self._write_executive_summary(f)
-            
-            # Program Classification
-            self._write_program_classification(f)
-            
-            # Call Graph
-            self._write_call_graph(f)
-            
-            # Register Map
-            self._write_register_map(f)
-            
-            # IO Map
-            self._write_io_map(f)
-            
-            # Error Handling
-            self._write_error_analysis(f)
-            
-            # Detailed Program Analysis
-            self._write_program_details(f)
-    
-    def _write_executive_summary(self, f):
+            f.write("".join(out))
+
+    def _write_executive_summary(self, out):
         """Write executive summary section"""
-        f.write("=" * 80 + "\n")
-        f.write("EXECUTIVE SUMMARY\n")
-        f.write("=" * 80 + "\n\n")
-        
-        # Count by type
-        type_counts = Counter(p.program_type for p in self.parser.programs.values())
-        
-        f.write("Program Distribution:\n")
-        for ptype, count in sorted(type_counts.items()):
-            f.write(f"  {ptype.capitalize()}: {count}\n")
-        f.write("\n")
-        
-        # Total lines of code
-        total_lines = sum(p.statistics.get('total_lines', 0) for p in self.parser.programs.values())
-        f.write(f"Total Lines of Code: {total_lines}\n\n")
-        
-        # Date range
+        out.append("=" * 80 + "\n")
+        out.append("EXECUTIVE SUMMARY\n")
+        out.append("=" * 80 + "\n\n")
+        
+        # Aggregate type counts, line totals, dates and products in one
+        # pass over the programs instead of four
+        type_counts = Counter()
+        total_lines = 0
         dates = []
+        products = set()
         for p in self.parser.programs.values():
+            type_counts[p.program_type] += 1
+            total_lines += p.statistics.get('total_lines', 0)
             if 'CREATE' in p.attributes:
                 dates.append(p.attributes['CREATE'])
             if 'MODIFIED' in p.attributes:
                 dates.append(p.attributes['MODIFIED'])
-        
-        if dates:
-            f.write(f"Oldest Program: {min(dates)}\n")
-            f.write(f"Newest Program: {max(dates)}\n\n")
-        
-        # Products supported
-        products = set()
-        for p in self.parser.programs.values():
             if p.product_code:
                 products.add(p.product_code)
-        
+
+        out.append("Program Distribution:\n")
+        for ptype, count in sorted(type_counts.items()):
+            out.append(f"  {ptype.capitalize()}: {count}\n")
+        out.append("\n")
+
+        out.append(f"Total Lines of Code: {total_lines}\n\n")
+
+        if dates:
+            out.append(f"Oldest Program: {min(dates)}\n")
+            out.append(f"Newest Program: {max(dates)}\n\n")
+
         if products:
-            f.write(f"Products Supported: {', '.join(sorted(products))}\n\n")
+            out.append(f"Products Supported: {', '.join(sorted(products))}\n\n")
     
-    def _write_program_classification(self, f):
+    def _write_program_classification(self, out, sorted_programs):
         """Write program classification section"""
-        f.write("=" * 80 + "\n")
-        f.write("PROGRAM CLASSIFICATION\n")
-        f.write("=" * 80 + "\n\n")
+        out.append("=" * 80 + "\n")
+        out.append("PROGRAM CLASSIFICATION\n")
+        out.append("=" * 80 + "\n\n")
         
         # Group by type
         by_type = defaultdict(list)
-        for name, prog in sorted(self.parser.programs.items()):
+        for name, prog in sorted_programs:
             by_type[prog.program_type].append((name, prog))
         
         for ptype in ['main', 'subprogram', 'utility', 'system', 'other']:
             if ptype not in by_type:
                 continue
             
-            f.write(f"{ptype.upper()} PROGRAMS ({len(by_type[ptype])}):\n")
-            f.write("-" * 40 + "\n")
+            out.append(f"{ptype.upper()} PROGRAMS ({len(by_type[ptype])}):\n")
+            out.append("-" * 40 + "\n")
             
-            for name, prog in sorted(by_type[ptype]):
+            for name, prog in by_type[ptype]:
                 size = prog.attributes.get('PROG_SIZE', 'N/A')
                 lines = prog.attributes.get('LINE_COUNT', 'N/A')
                 comment = prog.attributes.get('COMMENT', '')
                 
-                f.write(f"  {name:<20} Size: {size:>6}  Lines: {lines:>4}  {comment}\n")
+                out.append(f"  {name:<20} Size: {size:>6}  Lines: {lines:>4}  {comment}\n")
                 
                 if prog.has_iml:
-                    f.write(f"    - Has IML (In-Mold Labeling)\n")
+                    out.append(f"    - Has IML (In-Mold Labeling)\n")
                 if prog.product_code:
-                    f.write(f"    - Product: {prog.product_code}\n")
+                    out.append(f"    - Product: {prog.product_code}\n")
             
-            f.write("\n")
+            out.append("\n")
     
-    def _write_call_graph(self, f):
+    def _write_call_graph(self, out):
         """Write call graph section"""
-        f.write("=" * 80 + "\n")
-        f.write("CALL GRAPH ANALYSIS\n")
-        f.write("=" * 80 + "\n\n")
+        out.append("=" * 80 + "\n")
+        out.append("CALL GRAPH ANALYSIS\n")
+        out.append("=" * 80 + "\n\n")
         
         # Find main programs
         main_programs = [name for name, prog in self.parser.programs.items() 
                         if prog.program_type == 'main']
         
         for main_prog in sorted(main_programs):
-            f.write(f"{main_prog}\n")
-            self._write_call_tree(f, main_prog, indent=1, visited=set())
-            f.write("\n")
+            out.append(f"{main_prog}\n")
+            self._write_call_tree(out, main_prog, indent=1, visited=set())
+            out.append("\n")
     
-    def _write_call_tree(self, f, prog_name: str, indent: int, visited: Set[str]):
-        """Recursively write call tree"""
-        if prog_name in visited:
-            return
-        visited.add(prog_name)
-        
-        if prog_name in self.call_graph:
-            for called in sorted(set(self.call_graph[prog_name])):
-                f.write("  " * indent + f"├── {called}\n")
-                self._write_call_tree(f, called, indent + 1, visited)
+    def _write_call_tree(self, out, prog_name: str, indent: int, visited: Set[str]):
+        """Write call tree with an explicit stack (same order as the old
+        recursion, without Python call-stack depth limits)"""
+        stack = [(prog_name, indent, False)]
+        while stack:
+            name, depth, write_line = stack.pop()
+            if write_line:
+                out.append("  " * (depth - 1) + f"├── {name}\n")
+            if name in visited:
+                continue
+            visited.add(name)
+            for called in reversed(self._sorted_children.get(name, ())):
+                stack.append((called, depth + 1, True))
     
-    def _write_register_map(self, f):
+    def _write_register_map(self, out):
         """Write register map section"""
-        f.write("=" * 80 + "\n")
-        f.write("REGISTER MAP (R[X])\n")
-        f.write("=" * 80 + "\n\n")
+        out.append("=" * 80 + "\n")
+        out.append("REGISTER MAP (R[X])\n")
+        out.append("=" * 80 + "\n\n")
         
-        f.write(f"{'Reg':<6} {'Name':<40} {'Usage Count'}\n")
-        f.write("-" * 60 + "\n")
+        out.append(f"{'Reg':<6} {'Name':<40} {'Usage Count'}\n")
+        out.append("-" * 60 + "\n")
         
         for reg_num in sorted(self.register_map.keys()):
             names = list(self.register_map[reg_num])
-            # Count usage across all programs
-            usage = sum(1 for p in self.parser.programs.values() 
-                       if any(r[0] == reg_num for r in p.registers_used))
+            usage = self.register_program_count[reg_num]
             
             if names:
                 name = names[0] if len(names) == 1 else f"{names[0]} (+{len(names)-1} variants)"
-                f.write(f"R[{reg_num:<3}] {name:<40} {usage}\n")
+                out.append(f"R[{reg_num:<3}] {name:<40} {usage}\n")
         
-        f.write("\n")
+        out.append("\n")
     
-    def _write_io_map(self, f):
+    def _write_io_map(self, out):
         """Write IO map section"""
-        f.write("=" * 80 + "\n")
-        f.write("IO MAPPING\n")
-        f.write("=" * 80 + "\n\n")
+        out.append("=" * 80 + "\n")
+        out.append("IO MAPPING\n")
+        out.append("=" * 80 + "\n\n")
         
         for io_type in ['DI', 'DO', 'RI', 'RO']:
-            f.write(f"{io_type} (Digital/Register {'Input' if io_type[1] == 'I' else 'Output'}):\n")
-            f.write("-" * 60 + "\n")
+            out.append(f"{io_type} (Digital/Register {'Input' if io_type[1] == 'I' else 'Output'}):\n")
+            out.append("-" * 60 + "\n")
             
             if self.io_map[io_type]:
-                f.write(f"{'Num':<6} {'Name':<50}\n")
+                out.append(f"{'Num':<6} {'Name':<50}\n")
                 for num in sorted(self.io_map[io_type].keys()):
                     names = list(self.io_map[io_type][num])
                     name = names[0] if len(names) == 1 else f"{names[0]} (+{len(names)-1} variants)"
-                    f.write(f"{io_type}[{num:<3}] {name}\n")
+                    out.append(f"{io_type}[{num:<3}] {name}\n")
             else:
-                f.write("  None found\n")
+                out.append("  None found\n")
             
-            f.write("\n")
+            out.append("\n")
     
-    def _write_error_analysis(self, f):
+    def _write_error_analysis(self, out, sorted_programs):
         """Write error handling analysis"""
-        f.write("=" * 80 + "\n")
-        f.write("ERROR HANDLING ANALYSIS\n")
-        f.write("=" * 80 + "\n\n")
+        out.append("=" * 80 + "\n")
+        out.append("ERROR HANDLING ANALYSIS\n")
+        out.append("=" * 80 + "\n\n")
         
         # Collect all error labels
         all_errors = []
-        for prog_name, prog in self.parser.programs.items():
+        for prog_name, prog in sorted_programs:
             for err_num, err_name in prog.errors:
                 all_errors.append((err_num, err_name, prog_name))
         
         if all_errors:
-            f.write(f"{'Label':<12} {'Description':<40} {'Program'}\n")
-            f.write("-" * 80 + "\n")
+            out.append(f"{'Label':<12} {'Description':<40} {'Program'}\n")
+            out.append("-" * 80 + "\n")
             
             for err_num, err_name, prog_name in sorted(all_errors):
-                f.write(f"LBL[{err_num:<4}] {err_name:<40} {prog_name}\n")
+                out.append(f"LBL[{err_num:<4}] {err_name:<40} {prog_name}\n")
         else:
-            f.write("No error labels found\n")
+            out.append("No error labels found\n")
         
-        f.write("\n")
+        out.append("\n")
     
-    def _write_program_details(self, f):
+    def _write_program_details(self, out, sorted_programs):
         """Write detailed program analysis"""
-        f.write("=" * 80 + "\n")
-        f.write("DETAILED PROGRAM ANALYSIS\n")
-        f.write("=" * 80 + "\n\n")
+        out.append("=" * 80 + "\n")
+        out.append("DETAILED PROGRAM ANALYSIS\n")
+        out.append("=" * 80 + "\n\n")
         
-        for name, prog in sorted(self.parser.programs.items()):
-            f.write(f"Program: {name}\n")
-            f.write("-" * 40 + "\n")
+        for name, prog in sorted_programs:
+            out.append(f"Program: {name}\n")
+            out.append("-" * 40 + "\n")
             
             # Attributes
             if prog.attributes:
-                f.write("Attributes:\n")
+                out.append("Attributes:\n")
                 for key, value in sorted(prog.attributes.items()):
-                    f.write(f"  {key}: {value}\n")
+                    out.append(f"  {key}: {value}\n")
             
             # Statistics
             if prog.statistics:
-                f.write("\nStatistics:\n")
+                out.append("\nStatistics:\n")
                 for key, value in sorted(prog.statistics.items()):
-                    f.write(f"  {key}: {value}\n")
+                    out.append(f"  {key}: {value}\n")
             
             # Labels
             if prog.labels:
-                f.write(f"\nLabels ({len(prog.labels)}):\n")
-                for lbl_num, lbl_name, _ in sorted(prog.labels)[:20]:  # First 20
-                    f.write(f"  LBL[{lbl_num}]: {lbl_name}\n")
+                out.append(f"\nLabels ({len(prog.labels)}):\n")
+                for lbl_num, lbl_name in sorted(prog.labels)[:20]:  # First 20
+                    out.append(f"  LBL[{lbl_num}]: {lbl_name}\n")
                 if len(prog.labels) > 20:
-                    f.write(f"  ... and {len(prog.labels) - 20} more\n")
+                    out.append(f"  ... and {len(prog.labels) - 20} more\n")
             
             # Calls
             if prog.calls:
-                calls_set = set(call[0] for call in prog.calls)
-                f.write(f"\nCalls ({len(calls_set)}):\n")
+                calls_set = set(prog.calls)
+                out.append(f"\nCalls ({len(calls_set)}):\n")
                 for call in sorted(calls_set):
-                    f.write(f"  CALL {call}\n")
+                    out.append(f"  CALL {call}\n")
             
             # Positions
             if prog.positions:
-                f.write(f"\nPositions ({len(prog.positions)}):\n")
+                out.append(f"\nPositions ({len(prog.positions)}):\n")
                 for pos_num, pos_name in sorted(prog.positions)[:10]:  # First 10
-                    f.write(f"  P[{pos_num}]: {pos_name}\n")
+                    out.append(f"  P[{pos_num}]: {pos_name}\n")
                 if len(prog.positions) > 10:
-                    f.write(f"  ... and {len(prog.positions) - 10} more\n")
+                    out.append(f"  ... and {len(prog.positions) - 10} more\n")
             
-            f.write("\n" + "=" * 80 + "\n\n")
+            out.append("\n" + "=" * 80 + "\n\n")
 
 
 def main():
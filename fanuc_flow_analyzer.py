@@ -15,15 +15,87 @@ from collections import defaultdict, deque
 from typing import Dict, List, Set, Tuple
 
 
+# Combined token pattern: one finditer sweep over the /MN text replaces the
+# four per-line searches. Conditional jumps are matched before bare jumps and
+# label references so that a JMP line records a successor instead of being
+# misread as a label definition.
+_TOKEN_RE = re.compile(
+    r'(?P<ifj>IF\s+(?P<cond>.+?),JMP\s+LBL\[(?P<itgt>\d+))'
+    r'|(?P<jmp>JMP\s+LBL\[(?P<jtgt>\d+))'
+    r'|(?P<lbl>LBL\[)'
+    r'|(?P<end>\bEND\b)'
+)
+_ZONE_RE = re.compile(r'!.*?(vorm|keerunit|printer|buffer|tafel)', re.IGNORECASE)
+
+# Section rules shared by both diagram generators, built once
+_H1 = "=" * 80 + "\n"
+_H2 = "-" * 40 + "\n"
+
+# Main production-cycle labels in order, with fallback descriptions used
+# when the program doesn't name them
+_CYCLE_PATTERNS = (
+    (10, "NAAR INDUIK / Wait for mold"),
+    (20, "Cyclusteller / Main cycle"),
+    (25, "Pre-checks"),
+    (30, "UITNAME / Take product"),
+    (35, "Product check"),
+    (40, "UITNAME CONTROLE / Grip control"),
+    (130, "KEREN / Turn 1"),
+    (140, "KEREN / Turn 2"),
+    (150, "PRINTEN / Print"),
+    (160, "AFLEGGEN / Place"),
+    (170, "FOLIE / Film handling"),
+    (200, "Return to cycle"),
+)
+
+# Label -> state name mapping for the state machine diagram
+_STATE_MAP = {
+    10: "IDLE / WAIT_MOLD_CLOSED",
+    20: "CYCLE_START",
+    30: "TAKE_PRODUCT",
+    35: "CHECK_PRODUCT",
+    40: "CHECK_GRIP",
+    130: "TURN_1",
+    140: "TURN_2",
+    150: "PRINT",
+    160: "PLACE",
+    170: "GET_FILM",
+    200: "RETURN",
+}
+
+# Error-handler actions keyed by literal markers; each entry lists the
+# substrings that must all be present. Every matching entry is reported, in
+# tag order, once per node, and plain substring scans stay at C level.
+_ACTION_TAGS = (
+    (('CALL TEKST',), "Display error message"),
+    (('Open hand',), "Open gripper"),
+    (('P[1:rust positie]',), "Move to safe position"),
+    (('WAIT', 'USER'), "Wait for operator confirmation"),
+    (('ABORT',), "Abort program"),
+)
+
+
 class FlowNode:
     """Represents a node in the control flow"""
-    
+
+    # Large programs create thousands of nodes; a fixed slot layout drops the
+    # per-instance __dict__ and makes the attribute reads in the diagram
+    # writers direct slot fetches
+    __slots__ = ('label_num', 'label_name', 'instructions_span',
+                 '_instructions_cache', 'successors', 'conditions')
+
     def __init__(self, label_num: int, label_name: str = ""):
         self.label_num = label_num
         self.label_name = label_name
-        self.instructions = []
+        self.instructions_span = (0, 0)  # [start, end) into the shared code text
+        self._instructions_cache = None  # Lazily materialized instruction tuple
         self.successors = []  # List of label numbers this jumps to
         self.conditions = []  # Conditions for conditional jumps
+
+    def instructions_text(self, buf: str) -> str:
+        """This node's slice of the shared /MN code text"""
+        start, end = self.instructions_span
+        return buf[start:end]
         
     def __repr__(self):
         name_str = f":{self.label_name}" if self.label_name else ""
@@ -40,112 +112,161 @@ class FANUCFlowAnalyzer:
         self.entry_point = None
         self.error_nodes = []
         self.main_cycle_labels = []
+        self.homing_labels = []
+        self._sorted_labels = []   # flow_nodes keys, sorted once after parse
+        self._sorted_errors = []   # error_nodes, sorted once after parse
+        self._code_text = ""       # /MN text; nodes hold spans into it
         
     def parse_program(self):
         """Parse the program and build flow graph"""
-        with open(self.program_file, 'r', encoding='latin-1', errors='ignore') as f:
-            content = f.read()
+        content = Path(self.program_file).read_text(encoding='latin-1', errors='ignore')
         
-        # Extract /MN section
-        mn_match = re.search(r'/MN(.*?)/(?:POS|END)', content, re.DOTALL)
-        if not mn_match:
+        # Extract /MN section with fixed-string finds: the old non-greedy
+        # DOTALL pattern walked the file byte-by-byte looking for /POS or
+        # /END, where two C-level substring searches do the same job
+        mn_start = content.find('/MN')
+        if mn_start < 0:
             return
-        
-        code_text = mn_match.group(1)
-        lines = code_text.split('\n')
-        
+        mn_start += 3
+        bounds = [i for i in (content.find('/POS', mn_start),
+                              content.find('/END', mn_start)) if i >= 0]
+        if not bounds:
+            return
+        code_text = content[mn_start:min(bounds)]
+        self._code_text = code_text
+
+        # Sweep the /MN text once with the combined token pattern instead of
+        # running four searches per line. Each node's instructions are the
+        # lines between its label line and the next label (or END).
         current_node = None
-        
-        for line_num, line in enumerate(lines):
-            line = line.strip()
-            
-            # Skip comments and empty lines
-            if not line or line.startswith('!'):
+        instr_start = 0
+        pos = 0
+
+        while True:
+            match = _TOKEN_RE.search(code_text, pos)
+            if match is None:
+                break
+            pos = match.end()
+
+            # The old per-line parser skipped comment lines entirely; keep
+            # that fidelity so a commented-out jump, label or END stays dead
+            if self._in_comment_line(code_text, match.start()):
                 continue
-            
-            # Parse label definitions
-            label_match = re.search(r'LBL\[(\d+)(?::([^\]]+))?\]', line)
-            if label_match:
-                label_num = int(label_match.group(1))
-                label_name = label_match.group(2).strip() if label_match.group(2) else ""
-                
+
+            if match.group('lbl') is not None:
+                # Hand-roll the hottest token: two str.find calls pull the
+                # number and name out of LBL[num:name], and pos skips past
+                # the closing bracket so the name is never rescanned
+                bracket = code_text.find(']', pos)
+                if bracket < 0:
+                    continue
+                inner = code_text[pos:bracket]
+                pos = bracket + 1
+
+                colon = inner.find(':')
+                if colon < 0:
+                    num_text, label_name = inner, ""
+                else:
+                    num_text, label_name = inner[:colon], inner[colon + 1:].strip()
+                if not num_text.isdigit():
+                    continue
+                label_num = int(num_text)
+
+                if current_node is not None:
+                    current_node.instructions_span = (
+                        instr_start, self._line_start(code_text, match.start()))
+
                 current_node = FlowNode(label_num, label_name)
                 self.flow_nodes[label_num] = current_node
-                
+                instr_start = self._line_end(code_text, match.end())
+
                 # Identify special labels
                 if label_num == 10 or label_num == 20:
                     self.main_cycle_labels.append(label_num)
                 elif 500 <= label_num < 800:
                     self.error_nodes.append(label_num)
-                
+                if ((1000 <= label_num < 1100 or 'HOME' in label_name.upper())
+                        and label_num not in self.homing_labels):
+                    self.homing_labels.append(label_num)
+
+            elif current_node is None:
+                # Jumps and END before the first label belong to no node
                 continue
-            
-            # If we have a current node, add instructions
-            if current_node:
-                current_node.instructions.append(line)
-                
-                # Parse jumps
-                jump_match = re.search(r'JMP\s+LBL\[(\d+)', line)
-                if jump_match:
-                    target = int(jump_match.group(1))
-                    current_node.successors.append(target)
-                    
-                    # Check if conditional
-                    if_match = re.search(r'IF\s+(.+?),JMP', line)
-                    if if_match:
-                        current_node.conditions.append(if_match.group(1))
-                
+
+            elif match.group('ifj') is not None:
+                current_node.successors.append(int(match.group('itgt')))
+                current_node.conditions.append(match.group('cond'))
+
+            elif match.group('jmp') is not None:
+                current_node.successors.append(int(match.group('jtgt')))
+
+            else:
                 # END statement terminates flow
-                if re.search(r'\bEND\b', line):
-                    current_node = None
+                current_node.instructions_span = (
+                    instr_start, self._line_end(code_text, match.end()))
+                current_node = None
+
+        if current_node is not None:
+            current_node.instructions_span = (instr_start, len(code_text))
+
+        # Sort once; the diagram writers and error analysis reuse these
+        self._sorted_labels = sorted(self.flow_nodes.keys())
+        self._sorted_errors = sorted(self.error_nodes)
+
+    @staticmethod
+    def _line_start(text: str, pos: int) -> int:
+        """Offset of the start of the line containing pos"""
+        return text.rfind('\n', 0, pos) + 1
+
+    @classmethod
+    def _in_comment_line(cls, text: str, pos: int) -> bool:
+        """True if the line containing pos starts (after blanks) with '!'"""
+        i = cls._line_start(text, pos)
+        while i < pos and text[i] in ' \t':
+            i += 1
+        return i < pos and text[i] == '!'
+
+    @staticmethod
+    def _line_end(text: str, pos: int) -> int:
+        """Offset just past the end of the line containing pos"""
+        end = text.find('\n', pos)
+        return len(text) if end < 0 else end + 1
+
+    def _node_instructions(self, node: FlowNode) -> Tuple[str, ...]:
+        """Materialize a node's stripped, non-comment instruction lines.
+
+        The result is frozen to a tuple and cached on the node: instructions
+        are never mutated after parsing, and the compact tuple avoids list
+        over-allocation when several analyses revisit the same node.
+        """
+        instructions = node._instructions_cache
+        if instructions is None:
+            instructions = tuple(
+                stripped
+                for stripped in (line.strip()
+                                 for line in node.instructions_text(self._code_text).split('\n'))
+                if stripped and not stripped.startswith('!'))
+            node._instructions_cache = instructions
+        return instructions
     
     def identify_cycle_flow(self) -> List[Tuple[int, str]]:
         """Identify the main production cycle flow"""
-        cycle = []
-        
-        # Common cycle labels in order
-        cycle_patterns = [
-            (10, "NAAR INDUIK / Wait for mold"),
-            (20, "Cyclusteller / Main cycle"),
-            (25, "Pre-checks"),
-            (30, "UITNAME / Take product"),
-            (35, "Product check"),
-            (40, "UITNAME CONTROLE / Grip control"),
-            (130, "KEREN / Turn 1"),
-            (140, "KEREN / Turn 2"),
-            (150, "PRINTEN / Print"),
-            (160, "AFLEGGEN / Place"),
-            (170, "FOLIE / Film handling"),
-            (200, "Return to cycle")
-        ]
-        
-        for label_num, description in cycle_patterns:
-            if label_num in self.flow_nodes:
-                node = self.flow_nodes[label_num]
-                cycle.append((label_num, node.label_name or description))
-        
-        return cycle
-    
+        return [(label_num, self.flow_nodes[label_num].label_name or description)
+                for label_num, description in _CYCLE_PATTERNS
+                if label_num in self.flow_nodes]
+
     def identify_error_handling(self) -> List[Tuple[int, str, List[str]]]:
         """Identify error handling procedures"""
         errors = []
         
-        for label_num in sorted(self.error_nodes):
+        for label_num in self._sorted_errors:
             node = self.flow_nodes[label_num]
             
-            # Extract key actions
-            actions = []
-            for instr in node.instructions:
-                if 'CALL TEKST' in instr:
-                    actions.append("Display error message")
-                elif 'Open hand' in instr:
-                    actions.append("Open gripper")
-                elif 'P[1:rust positie]' in instr:
-                    actions.append("Move to safe position")
-                elif 'WAIT' in instr and 'USER' in instr:
-                    actions.append("Wait for operator confirmation")
-                elif 'ABORT' in instr:
-                    actions.append("Abort program")
+            # Extract key actions with one substring scan per tag over the
+            # node's contiguous text slice (no per-line string objects)
+            text = node.instructions_text(self._code_text)
+            actions = [action for markers, action in _ACTION_TAGS
+                       if all(marker in text for marker in markers)]
             
             errors.append((label_num, node.label_name, actions))
         
@@ -156,135 +277,132 @@ class FANUCFlowAnalyzer:
         homing_info = {
             'has_homing': False,
             'label': None,
-            'zones': [],
+            'zones': set(),
             'checks': []
         }
         
-        # Look for LBL[1000] or similar homing labels
-        for label_num, node in self.flow_nodes.items():
-            if 1000 <= label_num < 1100 or 'HOME' in node.label_name.upper():
-                homing_info['has_homing'] = True
-                homing_info['label'] = label_num
-                
-                # Analyze instructions
-                for instr in node.instructions:
-                    # Zone checks
-                    if 'R[200' in instr or 'R[199' in instr or 'R[198' in instr:
-                        homing_info['checks'].append(instr)
-                    
-                    # Position checks
-                    if 'IF' in instr and 'JMP' in instr:
-                        zone_match = re.search(r'!.*?(vorm|keerunit|printer|buffer|tafel)', instr, re.IGNORECASE)
-                        if zone_match:
-                            homing_info['zones'].append(zone_match.group(1))
+        # Homing labels were bucketed during parse_program, so only they
+        # are visited instead of every flow node
+        for label_num in self.homing_labels:
+            node = self.flow_nodes[label_num]
+            homing_info['has_homing'] = True
+            homing_info['label'] = label_num
+
+            # Analyze instructions
+            for instr in self._node_instructions(node):
+                # Zone checks
+                if 'R[200' in instr or 'R[199' in instr or 'R[198' in instr:
+                    homing_info['checks'].append(instr)
+
+                # Position checks; the zone pattern only ever matches
+                # inside a trailing comment, so gate on '!' first
+                if 'IF' in instr and 'JMP' in instr and '!' in instr:
+                    zone_match = _ZONE_RE.search(instr)
+                    if zone_match:
+                        homing_info['zones'].add(zone_match.group(1).lower())
         
         return homing_info
     
     def generate_flow_diagram(self, output_file: str):
         """Generate a text-based flow diagram"""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write(f"FLOW ANALYSIS: {self.program_name}\n")
-            f.write("=" * 80 + "\n\n")
-            
-            # Main cycle flow
-            f.write("MAIN PRODUCTION CYCLE:\n")
-            f.write("-" * 40 + "\n")
-            cycle = self.identify_cycle_flow()
-            for i, (label_num, description) in enumerate(cycle):
-                f.write(f"  {i+1}. LBL[{label_num}]: {description}\n")
-                if label_num in self.flow_nodes:
-                    node = self.flow_nodes[label_num]
-                    if node.successors:
-                        f.write(f"     → Jumps to: {node.successors}\n")
-            f.write("\n")
-            
-            # Error handling
-            f.write("ERROR HANDLING PROCEDURES:\n")
-            f.write("-" * 40 + "\n")
-            errors = self.identify_error_handling()
-            for label_num, name, actions in errors:
-                f.write(f"  LBL[{label_num}]: {name}\n")
-                if actions:
-                    for action in actions:
-                        f.write(f"    - {action}\n")
-                f.write("\n")
-            
-            # Homing procedure
-            f.write("HOMING PROCEDURE:\n")
-            f.write("-" * 40 + "\n")
-            homing = self.analyze_homing_procedure()
-            if homing['has_homing']:
-                f.write(f"  Label: LBL[{homing['label']}]\n")
-                if homing['zones']:
-                    f.write(f"  Zones checked: {', '.join(set(homing['zones']))}\n")
-                f.write(f"  Total checks: {len(homing['checks'])}\n")
-            else:
-                f.write("  No homing procedure found\n")
-            f.write("\n")
-            
-            # Control flow graph
-            f.write("CONTROL FLOW GRAPH:\n")
-            f.write("-" * 40 + "\n")
-            for label_num in sorted(self.flow_nodes.keys())[:30]:  # First 30
+        # Accumulate the diagram and write it once; binding append
+        # skips the attribute lookup inside the loops
+        parts = []
+        append = parts.append
+        append(_H1)
+        append(f"FLOW ANALYSIS: {self.program_name}\n")
+        append(_H1 + "\n")
+        
+        # Main cycle flow
+        append("MAIN PRODUCTION CYCLE:\n")
+        append(_H2)
+        cycle = self.identify_cycle_flow()
+        for i, (label_num, description) in enumerate(cycle):
+            append(f"  {i+1}. LBL[{label_num}]: {description}\n")
+            if label_num in self.flow_nodes:
                 node = self.flow_nodes[label_num]
-                f.write(f"  {node}\n")
-                if node.conditions:
-                    f.write(f"    Conditions: {node.conditions[0][:60]}...\n")
                 if node.successors:
-                    f.write(f"    → {', '.join(f'LBL[{s}]' for s in node.successors)}\n")
-            
-            if len(self.flow_nodes) > 30:
-                f.write(f"  ... and {len(self.flow_nodes) - 30} more labels\n")
-    
+                    append(f"     → Jumps to: {node.successors}\n")
+        append("\n")
+        
+        # Error handling
+        append("ERROR HANDLING PROCEDURES:\n")
+        append(_H2)
+        errors = self.identify_error_handling()
+        for label_num, name, actions in errors:
+            append(f"  LBL[{label_num}]: {name}\n")
+            if actions:
+                for action in actions:
+                    append(f"    - {action}\n")
+            append("\n")
+        
+        # Homing procedure
+        append("HOMING PROCEDURE:\n")
+        append(_H2)
+        homing = self.analyze_homing_procedure()
+        if homing['has_homing']:
+            append(f"  Label: LBL[{homing['label']}]\n")
+            if homing['zones']:
+                append(f"  Zones checked: {', '.join(homing['zones'])}\n")
+            append(f"  Total checks: {len(homing['checks'])}\n")
+        else:
+            append("  No homing procedure found\n")
+        append("\n")
+        
+        # Control flow graph
+        append("CONTROL FLOW GRAPH:\n")
+        append(_H2)
+        for label_num in self._sorted_labels[:30]:  # First 30
+            node = self.flow_nodes[label_num]
+            append(f"  {node}\n")
+            if node.conditions:
+                append(f"    Conditions: {node.conditions[0][:60]}...\n")
+            if node.successors:
+                append(f"    → {', '.join(f'LBL[{s}]' for s in node.successors)}\n")
+        
+        if len(self.flow_nodes) > 30:
+            append(f"  ... and {len(self.flow_nodes) - 30} more labels\n")
+
+        Path(output_file).write_text("".join(parts), encoding='utf-8')
+
     def generate_state_diagram(self, output_file: str):
         """Generate a state machine diagram"""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write(f"STATE MACHINE DIAGRAM: {self.program_name}\n")
-            f.write("=" * 80 + "\n\n")
-            
-            # Map labels to states
-            state_map = {
-                10: "IDLE / WAIT_MOLD_CLOSED",
-                20: "CYCLE_START",
-                30: "TAKE_PRODUCT",
-                35: "CHECK_PRODUCT",
-                40: "CHECK_GRIP",
-                130: "TURN_1",
-                140: "TURN_2", 
-                150: "PRINT",
-                160: "PLACE",
-                170: "GET_FILM",
-                200: "RETURN",
-            }
-            
-            f.write("STATE TRANSITIONS:\n")
-            f.write("-" * 40 + "\n\n")
-            
-            for label_num in sorted(state_map.keys()):
-                if label_num in self.flow_nodes:
-                    node = self.flow_nodes[label_num]
-                    state = state_map[label_num]
-                    
-                    f.write(f"State: {state}\n")
-                    f.write(f"  Label: LBL[{label_num}]: {node.label_name}\n")
-                    
-                    # Entry conditions
-                    f.write("  Entry: Previous state completed\n")
-                    
-                    # Actions (first 3 significant instructions)
-                    actions = [i for i in node.instructions if not i.startswith('!') and i][:3]
-                    if actions:
-                        f.write("  Actions:\n")
-                        for action in actions:
-                            f.write(f"    - {action[:70]}\n")
-                    
-                    # Exit conditions
-                    if node.successors:
-                        f.write(f"  Exit: Jump to {node.successors}\n")
-                    
-                    f.write("\n")
+        # Accumulate the diagram and write it once; binding append
+        # skips the attribute lookup inside the loops
+        parts = []
+        append = parts.append
+        append(_H1)
+        append(f"STATE MACHINE DIAGRAM: {self.program_name}\n")
+        append(_H1 + "\n")
+        
+        append("STATE TRANSITIONS:\n")
+        append(_H2 + "\n")
+        
+        for label_num in sorted(_STATE_MAP.keys()):
+            if label_num in self.flow_nodes:
+                node = self.flow_nodes[label_num]
+                state = _STATE_MAP[label_num]
+                
+                append(f"State: {state}\n")
+                append(f"  Label: LBL[{label_num}]: {node.label_name}\n")
+                
+                # Entry conditions
+                append("  Entry: Previous state completed\n")
+                
+                # Actions (first 3 significant instructions)
+                actions = self._node_instructions(node)[:3]
+                if actions:
+                    append("  Actions:\n")
+                    for action in actions:
+                        append(f"    - {action[:70]}\n")
+                
+                # Exit conditions
+                if node.successors:
+                    append(f"  Exit: Jump to {node.successors}\n")
+                
+                append("\n")
+
+        Path(output_file).write_text("".join(parts), encoding='utf-8')
 
 
 def main():